@@ -4,12 +4,46 @@ Base Tile Analyzer Class
 Handles fundamental tile classification and diagnostics with optimized window positioning
 """
 
+import atexit
 import json
+import os
+import time
 from pathlib import Path
 import cv2
 import numpy as np
 from mss import mss
 
+try:
+    from numba import njit
+except ImportError:  # numba is optional; analyze_grid falls back to NumPy
+    njit = None
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; mappings are written with json instead
+    orjson = None
+
+UNKNOWN_ID = -1  # type_id reported for colors with no mapping
+
+if njit is not None:
+    @njit(cache=True)
+    def _lookup_type_ids_numba(rgb, keys, vals, out):
+        """Compiled packed-RGB -> type_id lookup over sorted keys, written into out"""
+        h, w = rgb.shape[0], rgb.shape[1]
+        n = keys.shape[0]
+        for y in range(h):
+            for x in range(w):
+                packed = ((np.uint32(rgb[y, x, 0]) << 16)
+                          | (np.uint32(rgb[y, x, 1]) << 8)
+                          | np.uint32(rgb[y, x, 2]))
+                i = np.searchsorted(keys, packed)
+                if i < n and keys[i] == packed:
+                    out[y, x] = vals[i]
+                else:
+                    out[y, x] = UNKNOWN_ID
+else:
+    _lookup_type_ids_numba = None
+
 class TileAnalyzer:
     def __init__(self, mappings_file="type_mappings.json"):
         self.mappings_file = Path(mappings_file)
@@ -17,9 +51,19 @@ class TileAnalyzer:
         self.type_aliases = {}
         self.tile_properties = {}
         self.next_type_id = 0
+        self._learned_alias_count = 0  # Index of the next learned alias in A..Z, AA, AB, ...
         self.diag_window = None
         self.sct = mss()  # For screen information
+        self._mappings_version = 0  # Bumped whenever the lookups are rebuilt
+        self._last_diag_key = None
+        self._last_diag_img = None
+        self._diag_tiles = None  # Pre-rendered diagnostics cells, indexed by type_id
+        self._diag_tiles_version = None
+        self._grid_shape = None  # Shape the analyze_grid buffers were allocated for
+        self._dirty = False  # Mappings changed since the last write to disk
+        self._last_flush_time = 0.0
         self._load_mappings()
+        atexit.register(self._flush)
 
     def _load_mappings(self):
         """Load tile type mappings from JSON file"""
@@ -35,11 +79,78 @@ class TileAnalyzer:
             self.type_aliases = data.get("type_aliases", {})
             self.tile_properties = data.get("tile_properties", {})
             self.next_type_id = data.get("next_type_id", 0)
+            self._learned_alias_count = self._next_learned_alias_index()
+            self._rebuild_lookup()
             
         except Exception as e:
             print(f"Error loading mappings: {e}")
             self._create_default_mappings()
 
+    def _next_learned_alias_index(self):
+        """Index of the alias after the highest learned one in A..Z, AA, AB, ...
+        Hand-named tiles (e.g. "WATER") are skipped: only learned tiles take these aliases"""
+        next_index = 0
+        for alias in self.type_aliases.values():
+            if not (alias.isascii() and alias.isalpha() and alias.isupper()):
+                continue
+            if not self.tile_properties.get(alias, {}).get('learned'):
+                continue
+            index = 0
+            for ch in alias:  # Bijective base-26, the inverse of TileLearner._generate_alias
+                index = index*26 + ord(ch) - 64
+            next_index = max(next_index, index)
+        return next_index
+
+    @staticmethod
+    def _pack(r, g, b):
+        """Pack an RGB triple (scalars or uint32 arrays) into one 24-bit int"""
+        return (r << 16) | (g << 8) | b
+
+    def _rebuild_lookup(self):
+        """Rebuild the packed-color lookups used by analyze_grid"""
+        self._mappings_version += 1
+
+        # Parse the on-disk "r,g,b" keys once into integer keys
+        self._color_to_type_int = {}
+        for color_key, type_id in self.color_to_type.items():
+            r, g, b = map(int, color_key.split(','))
+            self._color_to_type_int[self._pack(r, g, b)] = int(type_id)
+
+        keys = list(self._color_to_type_int.keys())
+        ids = list(self._color_to_type_int.values())
+        order = np.argsort(keys)
+        self._color_keys = np.array(keys, dtype=np.uint32)[order]
+        self._color_ids = np.array(ids, dtype=np.int32)[order]
+
+        # One slot past the highest type_id so misses (UNKNOWN_ID) index "unknown"
+        size = max([int(t) for t in self.type_aliases] + ids + [-1]) + 2
+        self._alias_array = np.full(size, "unknown", dtype=object)
+        for type_id, alias in self.type_aliases.items():
+            self._alias_array[int(type_id)] = alias
+
+        # Per-type_id property tables (SoA) so per-tile access is an array index
+        self._walkable_arr = np.zeros(size, dtype=bool)
+        self._interactable_arr = np.zeros(size, dtype=bool)
+        self._is_player_arr = np.zeros(size, dtype=bool)
+        self._is_unknown_arr = np.zeros(size, dtype=bool)
+        self._bg_color_arr = np.zeros((size, 3), dtype=np.uint8)
+        for type_id, alias in enumerate(self._alias_array):
+            properties = self.tile_properties.get(alias, {})
+            self._walkable_arr[type_id] = bool(properties.get("walkable"))
+            self._interactable_arr[type_id] = bool(properties.get("interactable"))
+            self._is_player_arr[type_id] = alias == "player"
+            self._is_unknown_arr[type_id] = alias == "unknown"  # Includes type_ids with no alias
+
+            # Note that these color values are based on the default CV2 BGR color space.
+            if alias == "player":
+                self._bg_color_arr[type_id] = (255, 0, 0)  # Blue
+            elif alias == "unknown":
+                self._bg_color_arr[type_id] = (100, 100, 100)  # Grey
+            elif properties.get("walkable"):
+                self._bg_color_arr[type_id] = (0, 100, 0)  # Green
+            else:
+                self._bg_color_arr[type_id] = (0, 0, 100)  # Red
+
     def _create_default_mappings(self):
         """Create default empty mappings"""
         self.color_to_type = {}
@@ -62,71 +173,114 @@ class TileAnalyzer:
             "unknown": {"walkable": True, "interactable": False}
         }
         self.next_type_id = 0
+        self._learned_alias_count = 0
         self._save_mappings()
+        self._flush()
 
     def _save_mappings(self):
-        """Save current mappings to file"""
+        """Apply changed mappings and mark them for writing to file"""
+        self._rebuild_lookup()
+        self._dirty = True
+
+    def _flush_if_due(self, min_interval=5.0):
+        """Write pending mappings if the last write was at least min_interval seconds ago"""
+        if self._dirty and time.monotonic() - self._last_flush_time >= min_interval:
+            self._flush()
+
+    def _flush(self):
+        """Write pending mappings to file atomically"""
+        if not self._dirty:
+            return
+
         data = {
             "color_to_type": self.color_to_type,
             "type_aliases": self.type_aliases,
             "tile_properties": self.tile_properties,
             "next_type_id": self.next_type_id
         }
-        with open(self.mappings_file, 'w') as f:
-            json.dump(data, f, indent=2)
+        tmp_file = self.mappings_file.with_name(self.mappings_file.name + ".tmp")
+        if orjson is not None:
+            with open(tmp_file, 'wb') as f:
+                f.write(orjson.dumps(data, option=orjson.OPT_INDENT_2))
+        else:
+            with open(tmp_file, 'w') as f:
+                json.dump(data, f, indent=2)
+        os.replace(tmp_file, self.mappings_file)
+
+        self._dirty = False
+        self._last_flush_time = time.monotonic()
+
+    def _grid_buffers(self, shape):
+        """(Re)allocate analyze_grid's scratch and output buffers for a grid shape"""
+        if shape != self._grid_shape:
+            self._packed_scratch = np.empty(shape, dtype=np.uint32)
+            self._channel_scratch = np.empty(shape, dtype=np.uint32)
+            self._hit_scratch = np.empty(shape, dtype=bool)
+            self._type_id_out = np.empty(shape, dtype=np.int32)
+            self._grid_shape = shape
 
     def analyze_grid(self, rgb_grid):
-        """Convert RGB grid to tile type aliases grid"""
+        """Convert RGB grid to a 2D grid of type_ids (UNKNOWN_ID for unknown colors)
+
+        The returned array is reused (overwritten) by the next call.
+        """
         if rgb_grid is None:
             return None
-            
-        alias_grid = []
-        for row in rgb_grid:
-            alias_row = []
-            for pixel in row:
-                color_key = f"{pixel[0]},{pixel[1]},{pixel[2]}"
-                type_id = self.color_to_type.get(color_key, -1)
-                alias = self.type_aliases.get(str(type_id), "unknown")
-                alias_row.append(alias)
-            alias_grid.append(alias_row)
-        return alias_grid
-
-    def show_diagnostics(self, alias_grid):
-        """Create diagnostics window positioned in empty screen space"""
-        if alias_grid is None:
-            return
 
-        # Create diagnostics image
-        scale_factor = 6
-        h, w = len(alias_grid), len(alias_grid[0])
-        diag_img = np.zeros((h*scale_factor*10, w*scale_factor*10, 3), dtype=np.uint8)
-        
-        for y in range(h):
-            for x in range(w):
-                alias = alias_grid[y][x]
-                properties = self.tile_properties.get(alias, {})
-                px = x * scale_factor * 10 + 5
-                py = y * scale_factor * 10 + 5
-                
-                # Determine tile color
-                # Note that these color values are based on the default CV2 BGR color space.
-                if alias == "player":
-                    bg_color = (255, 0, 0)  # Blue
-                elif alias == "unknown":
-                    bg_color = (100, 100, 100)  # Grey
-                elif properties.get("walkable"):
-                    bg_color = (0, 100, 0)  # Green
-                else:
-                    bg_color = (0, 0, 100)  # Red
-                
-                # Draw tile and text
-                cv2.rectangle(diag_img, (px, py), (px + scale_factor*9, py + scale_factor*9), bg_color, -1)
-                text_color = (0, 0, 0) if alias == "player" else (255, 255, 255)
-                cv2.putText(diag_img, alias, (px, py + scale_factor*3), cv2.FONT_HERSHEY_SIMPLEX, 0.3, text_color, 1)
-                
-                if alias != "player":
-                    cv2.putText(diag_img, f"Walk: {'Y' if properties.get('walkable') else 'N'}", 
-                              (px, py + scale_factor*5), cv2.FONT_HERSHEY_SIMPLEX, 0.3, text_color, 1)
+        rgb = np.asarray(rgb_grid, dtype=np.uint8)
+        self._grid_buffers(rgb.shape[:2])
+        type_ids = self._type_id_out
+
+        if _lookup_type_ids_numba is not None:
+            _lookup_type_ids_numba(np.ascontiguousarray(rgb), self._color_keys, self._color_ids, type_ids)
+            return type_ids
+
+        if len(self._color_keys) == 0:
+            type_ids.fill(UNKNOWN_ID)
+            return type_ids
+
+        # packed = (r << 16) | (g << 8) | b, built in the preallocated scratch buffers
+        packed = self._packed_scratch
+        channel = self._channel_scratch
+        np.left_shift(rgb[..., 0], 16, out=packed, dtype=np.uint32)
+        np.left_shift(rgb[..., 1], 8, out=channel, dtype=np.uint32)
+        np.bitwise_or(packed, channel, out=packed)
+        np.bitwise_or(packed, rgb[..., 2], out=packed, dtype=np.uint32)
+
+        idx = np.searchsorted(self._color_keys, packed)
+        np.minimum(idx, len(self._color_keys) - 1, out=idx)
+        np.take(self._color_keys, idx, out=channel)
+        hit = np.equal(channel, packed, out=self._hit_scratch)
+        np.take(self._color_ids, idx, out=type_ids)
+        np.copyto(type_ids, UNKNOWN_ID, where=~hit)
+
+        return type_ids
+
+    def aliases_for(self, type_ids):
+        """Map a type_id grid to its alias strings"""
+        if type_ids is None:
+            return None
+        return self._alias_array[type_ids]
+
+    def show_diagnostics(self, type_ids):
+        """Create diagnostics window positioned in empty screen space
+        Returns False if the user closed the window, True otherwise"""
+        if type_ids is None:
+            return True
+
+        if self.diag_window is not None and cv2.getWindowProperty(self.diag_window, cv2.WND_PROP_VISIBLE) < 1:
+            # Closed by the user, so don't upload into (and recreate) it
+            self.diag_window = None
+            return False
+
+        # Only repaint when the grid or the mappings changed since the last draw;
+        # an open window keeps showing the last image on its own
+        diag_key = (self._mappings_version, type_ids.shape, type_ids.tobytes())
+        if diag_key == self._last_diag_key and self.diag_window is not None:
+            return True
+        if diag_key != self._last_diag_key:
+            self._last_diag_img = self._render_diagnostics(type_ids)
+            self._last_diag_key = diag_key
 
         # Window management
         if self.diag_window is None:
@@ -143,7 +297,40 @@ class TileAnalyzer:
             cv2.resizeWindow(self.diag_window, window_width, window_height)
             cv2.moveWindow(self.diag_window, pos_x, pos_y)
         
-        cv2.imshow(self.diag_window, diag_img)
+        cv2.imshow(self.diag_window, self._last_diag_img)
+        return True
+
+    def _build_diag_tiles(self):
+        """Pre-render one diagnostics cell (background and labels) per type_id"""
+        scale_factor = 6
+        cell = scale_factor * 10
+        tiles = np.zeros((len(self._alias_array), cell, cell, 3), dtype=np.uint8)
+
+        # Background fills the cell except a 5px gutter on the top/left
+        tiles[:, 5:, 5:] = self._bg_color_arr[:, None, None, :]
+
+        for type_id, alias in enumerate(self._alias_array):
+            is_player = self._is_player_arr[type_id]
+            text_color = (0, 0, 0) if is_player else (255, 255, 255)
+            cv2.putText(tiles[type_id], alias, (5, 5 + scale_factor*3), cv2.FONT_HERSHEY_SIMPLEX, 0.3, text_color, 1)
+            
+            if not is_player:
+                cv2.putText(tiles[type_id], f"Walk: {'Y' if self._walkable_arr[type_id] else 'N'}", 
+                          (5, 5 + scale_factor*5), cv2.FONT_HERSHEY_SIMPLEX, 0.3, text_color, 1)
+
+        self._diag_tiles = tiles
+        self._diag_tiles_version = self._mappings_version
+
+    def _render_diagnostics(self, type_ids):
+        """Draw the diagnostics image for a type_id grid"""
+        if self._diag_tiles_version != self._mappings_version:
+            self._build_diag_tiles()
+
+        # Lay the pre-rendered cells out as a (h*cell, w*cell) image in one gather
+        h, w = type_ids.shape
+        cell = self._diag_tiles.shape[1]
+        tiles = self._diag_tiles[type_ids]
+        return tiles.transpose(0, 2, 1, 3, 4).reshape(h*cell, w*cell, 3)
 
     def close_diagnostics(self):
         """Close diagnostics window if open"""
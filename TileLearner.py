@@ -4,19 +4,18 @@ Tile Learner Class with Enhanced POMDP Implementation
 Handles discovery and learning of new tile RGB values with probabilistic tracking
 """
 
-import time
-import math
-from collections import defaultdict
+import numpy as np
+
+MAX_POSITIONS = 16  # Initial rows in the belief tables (grown on demand)
 
 class TileLearner:
     def __init__(self, analyzer):
         self.analyzer = analyzer
         self.player_pos = (7, 7)  # Fixed player position (0-indexed)
         self.adjacent_offsets = [(-1, 0), (1, 0), (0, -1), (0, 1)]
+        self._adj_key = None  # (player_pos, grid shape) the neighbour indices were built for
         
         # RGB value tracking with rolling window
-        self.rgb_beliefs = defaultdict(dict)  # {position: {rgb_value: count}}
-        self.observation_history = defaultdict(list)  # {position: [rgb_values]}
         self.observation_window_size = 30  # Track last 30 observations
         self.candidate_positions = set()  # Positions ready for suggestion
         self.most_recent_candidate = None  # Track the most recent candidate
@@ -27,6 +26,76 @@ class TileLearner:
         self.learning_enabled = True
         self.confidence_threshold = 0.8  # Minimum confidence to stop observing
 
+        # log2(n) and n*log2(n) for every possible count, so entropy needs no per-call log2
+        n = np.arange(self.observation_window_size + 1, dtype=np.float64)
+        self._log2_table = np.log2(n, out=np.zeros_like(n), where=n > 0)
+        self._clog2_table = n * self._log2_table
+
+        # RGB beliefs and observation windows as fixed-size tables, one row per position
+        self._reset_belief_tables()
+
+    def _reset_belief_tables(self):
+        """Allocate empty belief tables"""
+        self._pos_index = {}  # {position: row}
+        self._entropy = {}  # {position: entropy}, refreshed whenever the row changes
+        self._quality = {}  # {position: observation quality}
+        self._free_rows = list(range(MAX_POSITIONS))
+        # A window holds at most observation_window_size distinct RGBs, so each gets an
+        # exact count; pruning to max_rgb_options happens when the beliefs are read
+        self._rgb_table = np.full((MAX_POSITIONS, self.observation_window_size), -1, dtype=np.int32)
+        self._count_table = np.zeros((MAX_POSITIONS, self.observation_window_size), dtype=np.uint16)
+
+        # Rolling observation window per position as a ring buffer of packed RGBs
+        self._hist_buf = np.zeros((MAX_POSITIONS, self.observation_window_size), dtype=np.uint32)
+        self._hist_head = np.zeros(MAX_POSITIONS, dtype=np.uint8)  # Next slot to write
+        self._hist_len = np.zeros(MAX_POSITIONS, dtype=np.uint8)
+
+    def _row_for(self, position):
+        """Return the belief table row for a position, allocating one if needed"""
+        row = self._pos_index.get(position)
+        if row is not None:
+            return row
+
+        if not self._free_rows:
+            n = len(self._rgb_table)
+            self._rgb_table = np.vstack([self._rgb_table, np.full_like(self._rgb_table, -1)])
+            self._count_table = np.vstack([self._count_table, np.zeros_like(self._count_table)])
+            self._hist_buf = np.vstack([self._hist_buf, np.zeros_like(self._hist_buf)])
+            self._hist_head = np.concatenate([self._hist_head, np.zeros_like(self._hist_head)])
+            self._hist_len = np.concatenate([self._hist_len, np.zeros_like(self._hist_len)])
+            self._free_rows = list(range(n, 2 * n))
+
+        row = self._free_rows.pop(0)
+        self._pos_index[position] = row
+        return row
+
+    def _release_row(self, position):
+        """Clear and free the belief table row for a position"""
+        row = self._pos_index.pop(position, None)
+        self._entropy.pop(position, None)
+        self._quality.pop(position, None)
+        if row is not None:
+            self._rgb_table[row] = -1
+            self._count_table[row] = 0
+            self._hist_head[row] = 0
+            self._hist_len[row] = 0
+            self._free_rows.append(row)
+
+    def _observation_count(self, position):
+        """Number of observations currently in the window for a position"""
+        row = self._pos_index.get(position)
+        return 0 if row is None else int(self._hist_len[row])
+
+    def _pack_rgb(self, rgb):
+        """Pack an RGB tuple into a single int"""
+        return self.analyzer._pack(int(rgb[0]), int(rgb[1]), int(rgb[2]))
+
+    @staticmethod
+    def _unpack_rgb(packed):
+        """Unpack a packed int back into an RGB tuple"""
+        packed = int(packed)
+        return ((packed >> 16) & 0xFF, (packed >> 8) & 0xFF, packed & 0xFF)
+
     def toggle_learning(self):
         """Toggle the learning process on/off"""
         self.learning_enabled = not self.learning_enabled
@@ -35,73 +104,129 @@ class TileLearner:
 
     def reset_learning(self):
         """Reset all learning progress and observations"""
-        self.rgb_beliefs = defaultdict(dict)
-        self.observation_history = defaultdict(list)
+        self._reset_belief_tables()
         self.candidate_positions = set()
         self.most_recent_candidate = None
         print("\nLearning process has been reset - all observations cleared")
 
-    def process_grid(self, rgb_grid, alias_grid):
+    def process_grid(self, rgb_grid, type_ids):
         """Process grid to discover unknown tiles with active learning focus"""
-        if not self.learning_enabled or rgb_grid is None or alias_grid is None:
+        if not self.learning_enabled or rgb_grid is None or type_ids is None:
             return
 
+        px, py = self.player_pos
+
         # Only process if player is at known position
-        if alias_grid[self.player_pos[1]][self.player_pos[0]] != "player":
+        if not self.analyzer._is_player_arr[type_ids[py, px]]:
             return
-
-        px, py = self.player_pos
         
-        # Get adjacent tiles sorted by observation quality (least confident first)
-        adjacent_tiles = []
-        for dx, dy in self.adjacent_offsets:
-            x, y = px + dx, py + dy
-            if 0 <= x < len(alias_grid[0]) and 0 <= y < len(alias_grid):
-                if alias_grid[y][x] == "unknown":
-                    adjacent_tiles.append((x, y))
+        # Gather all adjacent tiles at once, keeping the unknown ones
+        xs, ys = self._adjacent_indices(type_ids.shape)
+        unknown = self.analyzer._is_unknown_arr[type_ids[ys, xs]]
+        xs, ys = xs[unknown], ys[unknown]
+        rgb_values = np.asarray(rgb_grid)[ys, xs]
+        adjacent_tiles = list(zip(xs.tolist(), ys.tolist(), rgb_values.tolist()))
         
         # Sort by observation quality (least confident first)
-        adjacent_tiles.sort(key=lambda pos: self.get_observation_quality(pos))
+        adjacent_tiles.sort(key=lambda tile: self.get_observation_quality(tile[:2]))
         
         # Process tiles in priority order
-        for x, y in adjacent_tiles:
+        for x, y, rgb in adjacent_tiles:
             if self.needs_more_observations((x, y)):
-                self._update_rgb_beliefs((x, y), tuple(rgb_grid[y][x]))
+                self._update_rgb_beliefs((x, y), tuple(rgb))
+
+    def _adjacent_indices(self, shape):
+        """Return in-bounds neighbour (xs, ys) index arrays, rebuilt only when player_pos or shape change"""
+        key = (self.player_pos, shape)
+        if key != self._adj_key:
+            px, py = self.player_pos
+            offsets = np.array(self.adjacent_offsets, dtype=np.int32)
+            xs = px + offsets[:, 0]
+            ys = py + offsets[:, 1]
+            h, w = shape
+            in_bounds = (xs >= 0) & (xs < w) & (ys >= 0) & (ys < h)
+            self._adj_xs, self._adj_ys = xs[in_bounds], ys[in_bounds]
+            self._adj_key = key
+        return self._adj_xs, self._adj_ys
 
     def _update_rgb_beliefs(self, position, rgb_value):
         """Update RGB belief counts with rolling window"""
-        # Add to history
-        self.observation_history[position].append(rgb_value)
-        
-        # Trim to window size
-        if len(self.observation_history[position]) > self.observation_window_size:
-            self.observation_history[position].pop(0)
-        
-        # Rebuild beliefs from current window
-        self.rgb_beliefs[position] = defaultdict(int)
-        for rgb in self.observation_history[position]:
-            self.rgb_beliefs[position][rgb] += 1
+        row = self._row_for(position)
+        rgbs = self._rgb_table[row]
+        counts = self._count_table[row]
+
+        packed = self._pack_rgb(rgb_value)
+        head = int(self._hist_head[row])
+
+        # A full window overwrites its oldest observation (at head), so forget it first
+        if self._hist_len[row] == self.observation_window_size:
+            slot = (rgbs == self._hist_buf[row, head]).argmax()
+            counts[slot] -= 1
+            if counts[slot] == 0:
+                rgbs[slot] = -1
+        else:
+            self._hist_len[row] += 1
+        self._hist_buf[row, head] = packed
+        self._hist_head[row] = (head + 1) % self.observation_window_size
         
-        # Prune to only keep top N RGB values
-        if len(self.rgb_beliefs[position]) > self.max_rgb_options:
-            # Remove least observed RGB value
-            min_rgb = min(self.rgb_beliefs[position].items(), key=lambda x: x[1])[0]
-            del self.rgb_beliefs[position][min_rgb]
+        # Count the new observation, giving a new RGB a free slot
+        slot = (rgbs == packed).argmax()
+        if rgbs[slot] == packed:
+            counts[slot] += 1
+        else:
+            idx = counts.argmin()  # Always free: the window holds fewer RGBs than slots
+            rgbs[idx] = packed
+            counts[idx] = 1
+        self._refresh_scores(position, counts)
         
         # Check if ready to suggest
-        if (len(self.observation_history[position]) >= self.min_observations and 
+        if (self._hist_len[row] >= self.min_observations and 
             self.get_observation_quality(position) >= self.confidence_threshold):
             self.candidate_positions.add(position)
             self.most_recent_candidate = position
             self._suggest_new_tile(position)
 
+    def _tracked_counts(self, counts):
+        """Nonzero counts of a row, less the least observed once more than max_rgb_options are seen"""
+        counts = counts[counts > 0]
+        if len(counts) > self.max_rgb_options:
+            counts = np.delete(counts, counts.argmin())
+        return counts
+
+    def _packed_window(self, row):
+        """Packed RGBs in a row's window, oldest first"""
+        n = int(self._hist_len[row])
+        window = self._hist_buf[row, :n]
+        if n == self.observation_window_size:
+            window = np.roll(window, -int(self._hist_head[row]))
+        return window
+
+    def _belief_counts(self, position):
+        """Return the (packed_rgbs, counts) of tracked RGB values at position, in first-seen order"""
+        row = self._pos_index.get(position)
+        if row is None:
+            return None, None
+        counts = self._count_table[row]
+        mask = counts > 0
+        rgbs, counts = self._rgb_table[row][mask], counts[mask]
+        first_seen = (self._packed_window(row)[None, :] == rgbs[:, None]).argmax(axis=1)
+        order = np.argsort(first_seen)
+        rgbs, counts = rgbs[order], counts[order]
+        
+        # Prune to only keep top N RGB values (removing the least observed, earliest seen first)
+        if len(counts) > self.max_rgb_options:
+            least = counts.argmin()
+            rgbs, counts = np.delete(rgbs, least), np.delete(counts, least)
+        return rgbs, counts
+
     def get_belief_state(self, position):
         """Return normalized probability distribution for tile at position"""
-        if position not in self.rgb_beliefs or not self.rgb_beliefs[position]:
+        rgbs, counts = self._belief_counts(position)
+        if counts is None or not len(counts):
             return None
         
-        total = sum(self.rgb_beliefs[position].values())
-        return {rgb: count/total for rgb, count in self.rgb_beliefs[position].items()}
+        total = int(counts.sum())
+        return {self._unpack_rgb(rgb): int(count)/total for rgb, count in zip(rgbs, counts)}
 
     def get_most_likely_tile(self, position):
         """Return most probable RGB and confidence"""
@@ -112,30 +237,36 @@ class TileLearner:
         most_likely = max(belief.items(), key=lambda x: x[1])
         return most_likely
 
+    def _refresh_scores(self, position, counts):
+        """Recompute cached entropy and quality from a row of integer counts"""
+        counts = self._tracked_counts(counts)
+        total = int(counts.sum())
+        if total == 0:
+            self._entropy.pop(position, None)
+            self._quality.pop(position, None)
+            return
+
+        # H = log2(T) - sum(c*log2(c)) / T
+        entropy = max(0.0, float(self._log2_table[total] - self._clog2_table[counts].sum() / total))
+        max_entropy = self._log2_table[len(counts)]
+        self._entropy[position] = entropy
+        self._quality[position] = 1 - float(entropy / max_entropy) if max_entropy > 0 else 1
+
     def get_entropy(self, position):
         """Calculate Shannon entropy of belief distribution"""
-        belief = self.get_belief_state(position)
-        if not belief:
-            return 0.0
-        
-        return -sum(p * math.log2(p) for p in belief.values() if p > 0)
+        return self._entropy.get(position, 0.0)
 
     def get_observation_quality(self, position):
         """Score 0-1 of how confident we are about this tile"""
-        if position not in self.rgb_beliefs or not self.rgb_beliefs[position]:
-            return 0.0
-            
-        max_entropy = math.log2(len(self.rgb_beliefs[position]))
-        entropy = self.get_entropy(position)
-        return 1 - (entropy / max_entropy) if max_entropy > 0 else 1
+        return self._quality.get(position, 0.0)
 
     def needs_more_observations(self, position):
         """Determine if we should keep observing this tile"""
-        if position not in self.rgb_beliefs:
+        if position not in self._pos_index:
             return True
         
         # Check if we have enough observations
-        if len(self.observation_history[position]) < self.min_observations:
+        if self._observation_count(position) < self.min_observations:
             return True
         
         # Check if we're sufficiently confident
@@ -143,19 +274,22 @@ class TileLearner:
 
     def _get_top_rgb_values(self, position):
         """Return top RGB values by observation count"""
-        rgb_counts = self.rgb_beliefs[position]
-        total = sum(rgb_counts.values())
-        sorted_rgbs = sorted(rgb_counts.items(), key=lambda x: x[1], reverse=True)
+        rgbs, counts = self._belief_counts(position)
+        if counts is None or not len(counts):
+            return []
+        total = int(counts.sum())
+
+        order = np.argsort(-counts.astype(np.int32), kind='stable')[:self.max_rgb_options]
         
         return [
-            (rgb, count, count/total) 
-            for rgb, count in sorted_rgbs[:self.max_rgb_options]
+            (self._unpack_rgb(rgbs[i]), int(counts[i]), int(counts[i])/total) 
+            for i in order
         ]
 
     def _suggest_new_tile(self, position):
         """Suggest a new tile to be saved"""
         top_rgbs = self._get_top_rgb_values(position)
-        total_obs = len(self.observation_history[position])
+        total_obs = self._observation_count(position)
         confidence = self.get_observation_quality(position)
         
         print(f"\nTile Suggestion Ready at position {position}:")
@@ -220,11 +354,13 @@ class TileLearner:
                 self.analyzer.color_to_type[rgb_key] = type_id
         
         self.analyzer.next_type_id += 1
+        self.analyzer._learned_alias_count += 1
         self.analyzer._save_mappings()
+        self.analyzer._flush_if_due()
         
         # Clean up
-        del self.rgb_beliefs[position]
-        del self.observation_history[position]
+        total_obs = self._observation_count(position)
+        self._release_row(position)
         self.candidate_positions.discard(position)
         self.most_recent_candidate = None
         
@@ -236,20 +372,25 @@ class TileLearner:
         else:
             rgb = top_rgbs[0][0]
             print(f"RGB: ({rgb[0]}, {rgb[1]}, {rgb[2]})")
-        print(f"From {len(self.observation_history[position])} observations")
+        print(f"From {total_obs} observations")
         return True
 
     def _generate_alias(self):
         """Generate next available alphabetical alias"""
-        existing = [a for a in self.analyzer.type_aliases.values() 
-                   if len(a) == 1 and a.isalpha()]
-        return chr(65 + len(existing))  # A, B, C, etc.
+        n = self.analyzer._learned_alias_count
+        alias = ""
+        while True:  # A..Z, then AA, AB, ... (bijective base-26)
+            n, r = divmod(n, 26)
+            alias = chr(65 + r) + alias
+            if n == 0:
+                return alias
+            n -= 1
 
     def get_observation_stats(self):
         """Return observation statistics"""
-        total_obs = sum(len(history) for history in self.observation_history.values())
+        total_obs = int(self._hist_len.sum())
         return {
-            'positions_observed': len(self.observation_history),
+            'positions_observed': len(self._pos_index),
             'candidates_ready': len(self.candidate_positions),
             'total_observations': total_obs,
             'average_confidence': self._calculate_average_confidence()
@@ -257,13 +398,8 @@ class TileLearner:
 
     def _calculate_average_confidence(self):
         """Calculate average confidence across all observed positions"""
-        if not self.observation_history:
+        if not self._pos_index:
             return 0.0
             
-        total = 0.0
-        count = 0
-        for pos in self.observation_history:
-            if pos in self.rgb_beliefs:
-                total += self.get_observation_quality(pos)
-                count += 1
-        return total / count if count > 0 else 0.0
\ No newline at end of file
+        total = sum(self.get_observation_quality(pos) for pos in self._pos_index)
+        return total / len(self._pos_index)
\ No newline at end of file
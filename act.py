@@ -8,11 +8,18 @@ import time
 import subprocess
 from pynput.keyboard import Controller, Key
 
+try:
+    from Xlib import X, display as xdisplay, protocol  # Installed with pynput on X11
+except ImportError:
+    xdisplay = None
+
 class Action:
     def __init__(self):
         self.keyboard = Controller()
         self.emulator_window = None
+        self._display = None
         self._find_emulator_window()
+        self._open_display()
         
         # Key mappings
         self.KEY_MAP = {
@@ -49,12 +56,41 @@ class Action:
         except Exception as e:
             print(f"Window finding error: {e}")
 
+    def _open_display(self):
+        """Keep an X connection for focusing without spawning xdotool"""
+        if xdisplay is None or not self.emulator_window:
+            return
+        try:
+            self._display = xdisplay.Display()
+            self._root = self._display.screen().root
+            self._net_active_window = self._display.intern_atom('_NET_ACTIVE_WINDOW')
+            self._emulator_xwin = self._display.create_resource_object(
+                'window', int(self.emulator_window))
+        except Exception as e:
+            print(f"X display error: {e}")
+            self._display = None
+
     def _focus_emulator(self):
         """Bring emulator window to focus if not already focused"""
-        if self.emulator_window:
+        if not self.emulator_window:
+            return
+        if self._display is None:
             subprocess.run(['xdotool', 'windowactivate', self.emulator_window],
                           stdout=subprocess.DEVNULL,
                           stderr=subprocess.DEVNULL)
+            return
+
+        # Same _NET_ACTIVE_WINDOW request xdotool windowactivate sends
+        active = self._root.get_full_property(self._net_active_window, X.AnyPropertyType)
+        if active and active.value and active.value[0] == self._emulator_xwin.id:
+            return
+        event = protocol.event.ClientMessage(
+            window=self._emulator_xwin,
+            client_type=self._net_active_window,
+            data=(32, [2, X.CurrentTime, 0, 0, 0]))
+        self._root.send_event(
+            event, event_mask=X.SubstructureRedirectMask | X.SubstructureNotifyMask)
+        self._display.flush()
 
     def start_action(self, action, duration_sec):
         """Begin a new non-blocking action"""
@@ -66,16 +102,6 @@ class Action:
         self.action_remaining = int(duration_sec * self.loops_per_second)
         self._execute_key_press(True)  # Initial key press
 
-    def update(self):
-        """Update action state - call each main loop iteration"""
-        if self.action_remaining > 0:
-            self.action_remaining -= 1
-            if self.action_remaining == 0:
-                self._execute_key_press(False)  # Final key release
-                self.current_action = None
-            return True
-        return False
-
     def _execute_key_press(self, press):
         """Handle the actual key press/release"""
         key = self.KEY_MAP[self.current_action]
@@ -99,10 +125,12 @@ class Action:
 
     def update(self):
         """Update action state - returns True if action in progress"""
-        if self.action_remaining > 0:
-            self.action_remaining -= 1
-            if self.action_remaining == 0:
-                self._execute_key_press(False)
+        remaining = self.action_remaining
+        if remaining > 0:
+            remaining -= 1
+            self.action_remaining = remaining
+            if remaining == 0:
+                self._execute_key_press(False)  # Final key release
                 self.current_action = None
             return True
         return False
@@ -121,10 +149,15 @@ if __name__ == "__main__":
     print("Testing non-blocking controls...")
     
     # In your main loop you would do:
+    period = 1/action.loops_per_second
     action.start_state_load(1)
+    deadline = time.monotonic()
     while action.update():
-        time.sleep(1/action.loops_per_second)
+        deadline += period
+        time.sleep(max(0, deadline - time.monotonic()))
     
     action.start_move('right')
+    deadline = time.monotonic()
     while action.update():
-        time.sleep(1/action.loops_per_second)
\ No newline at end of file
+        deadline += period
+        time.sleep(max(0, deadline - time.monotonic()))
\ No newline at end of file
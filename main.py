@@ -4,13 +4,21 @@ Dragon Warrior Automation Controller with World Mapping
 """
 
 import cv2
+import queue
+import sys
+import threading
 import time
 import subprocess
-import os
 from pathlib import Path
 from sense import DragonWarriorSensor
 from think import Think
-from mapping import WorldMapper
+
+# Key codes compared against cv2.waitKey() every frame
+KEY_Q, KEY_G, KEY_R, KEY_D, KEY_M = ord('q'), ord('g'), ord('r'), ord('d'), ord('m')
+KEY_S, KEY_Z, KEY_F, KEY_L = ord('s'), ord('z'), ord('f'), ord('l')
+
+# waitKey sleeps in ~15 ms timer slices on Windows, so pace with sleep + pollKey there
+USE_POLL_KEY = sys.platform == 'win32' and hasattr(cv2, 'pollKey')
 
 class Config:
     """Centralized configuration manager"""
@@ -23,6 +31,7 @@ class Config:
         # Timing parameters
         self.loops_per_second = 15  # Target frame rate
         self.main_loop_delay = 1/self.loops_per_second
+        self.display_rate = 10  # Sensor window refreshes per second
 
         # Display options
         self.show_rgb_by_default = True
@@ -36,19 +45,23 @@ class Config:
 
 def start_emulator(config):
     """Launch Mesen with default configuration"""
-    config.emulator_path.chmod(0o755)
+    emulator_path = config.emulator_path.absolute()
+    rom_path = config.rom_path.absolute()
+    mode = emulator_path.stat().st_mode
+    if not mode & 0o111:
+        emulator_path.chmod(mode | 0o755)
     process = subprocess.Popen(
-        [str(config.emulator_path.absolute()), str(config.rom_path.absolute())],
+        [str(emulator_path), str(rom_path)],
         stdout=None,
-        stderr=None
+        stderr=None,
+        close_fds=False  # Skip the fd-table walk; we hold nothing the emulator could misuse
     )
     time.sleep(config.emulator_start_delay)
     return process
 
-def initialize_game():
+def initialize_game(config):
     """Initialize all game components"""
     try:
-        config = Config()
         emulator = start_emulator(config)
         print(f"Emulator started (PID: {emulator.pid})")
         
@@ -63,21 +76,61 @@ def initialize_game():
         if config.show_map_by_default:
             thinker.toggle_map()
         
-        return emulator, sensor, thinker, config
+        return emulator, sensor, thinker
     except Exception as e:
         print(f"Initialization failed: {e}")
         raise
 
+def wait_for_key(timeout):
+    """Wait out timeout seconds while pumping GUI events, return the key code (255 if none)"""
+    if USE_POLL_KEY:
+        if timeout > 0:
+            time.sleep(timeout)
+        return cv2.pollKey() & 0xFF
+    return cv2.waitKey(max(1, int(timeout * 1000))) & 0xFF
+
+def capture_loop(sensor, period, frames, free_slots, stop):
+    """Capture frames on a worker thread, keeping only the newest one queued"""
+    deadline = time.monotonic()
+    while not stop.is_set():
+        slot = free_slots.get()
+        frame_buf, grid_buf, rgb_img_buf = slot
+        frame, rgb_grid, rgb_img = sensor.capture_frame(
+            grid_out=grid_buf, frame_out=frame_buf, rgb_img_out=rgb_img_buf)
+        if rgb_img is not None:
+            slot[2] = rgb_img  # Keep the RGB values image once it has been allocated
+        
+        try:
+            frames.put_nowait((slot, frame, rgb_grid, rgb_img))
+        except queue.Full:
+            # Drop the stale frame so the main loop always gets the newest one
+            try:
+                stale_slot = frames.get_nowait()[0]
+                free_slots.put(stale_slot)
+            except queue.Empty:
+                pass
+            frames.put_nowait((slot, frame, rgb_grid, rgb_img))
+        
+        deadline += period
+        remaining_time = deadline - time.monotonic()
+        if remaining_time <= 0:
+            deadline = time.monotonic()  # Fell behind, don't try to catch up
+        stop.wait(max(0, remaining_time))
+
 def main():
     """Main application loop with world mapping"""
-    emulator = sensor = thinker = None
+    emulator = sensor = thinker = capture_thread = None
+    stop_capture = threading.Event()
     config = Config()
     show_fps = False
+    fps_ema = 0.0  # Smoothed FPS, printed at fps_print_interval
+    fps_print_interval = 0.5
+    last_fps_print = 0.0
     show_map = True
     
     try:
         # Initialize all components
-        emulator, sensor, thinker, config = initialize_game()
+        emulator, sensor, thinker = initialize_game(config)
         
         print("\nControls:")
         print("  q - Quit")
@@ -90,53 +143,86 @@ def main():
         print("  l - Toggle tile learning")
         print("  arrow keys - Simulate movement (for testing)")
         
+        # Capture buffer sets recycled between the capture thread and this loop:
+        # one being captured, one queued, one being processed and displayed
+        period = config.main_loop_delay
+        free_slots = queue.Queue()
+        for _ in range(3):
+            free_slots.put(sensor.new_capture_buffers())
+        frames = queue.Queue(maxsize=1)
+        capture_thread = threading.Thread(
+            target=capture_loop,
+            args=(sensor, period, frames, free_slots, stop_capture),
+            daemon=True)
+        capture_thread.start()
+
+        # Keys that just call a component method; q and f are handled inline
+        key_actions = {
+            KEY_G: sensor.toggle_grid,
+            KEY_R: sensor.toggle_rgb,
+            KEY_D: thinker.toggle_diagnostics,
+            KEY_M: thinker.toggle_map,
+            KEY_S: thinker.save_discovered_tiles,
+            KEY_Z: thinker.reset_learning,
+            KEY_L: thinker.toggle_learning,
+        }
+
         # Main loop
+        deadline = time.monotonic()
+        display_period = 1/config.display_rate
+        next_display = deadline
         while True:
-            frame_start = time.time()
-            
-            # Capture and process frame
-            frame, rgb_grid, _ = sensor.capture_frame()
-            cv2.imshow("Dragon Warrior Sensor", cv2.cvtColor(frame, cv2.COLOR_RGB2BGR))
+            frame_start = time.monotonic()
             
-            # Process frame if we have valid data
-            alias_grid = None
-            if rgb_grid is not None:
-                alias_grid = thinker.process_frame(rgb_grid)
+            # Take the newest captured frame
+            try:
+                slot, frame, rgb_grid, rgb_img = frames.get(timeout=1.0)
+            except queue.Empty:
+                slot = None  # Nothing captured this period, but keys still get handled
+            if slot is not None:
+                sensor.show_rgb_window(rgb_img)
+                if frame_start >= next_display:
+                    # Repaint at display_rate only; HighGUI has to stay on this thread
+                    cv2.imshow("Dragon Warrior Sensor", frame)
+                    next_display = frame_start + display_period
+                
+                # Process frame if we have valid data
+                if rgb_grid is not None:
+                    thinker.process_frame(rgb_grid)
                 
+                # imshow has copied what it needs, so the buffers can be captured into again
+                free_slots.put(slot)
+                
+                # Wait out the rest of the period inside waitKey against a fixed deadline (no drift)
+                deadline += period
+                remaining_time = deadline - time.monotonic()
+                if remaining_time <= 0:
+                    deadline = time.monotonic()  # Fell behind, don't try to catch up
+            else:
+                # The get already waited; just poll for keys and restart the schedule
+                remaining_time = 0
+                deadline = time.monotonic()
+
             # Handle input
-            key = cv2.waitKey(1) & 0xFF
-            if key == ord('q'):
+            key = wait_for_key(remaining_time)
+            action = key_actions.get(key)
+            if action is not None:
+                action()
+            elif key == KEY_Q:
                 break
-            elif key == ord('g'):
-                sensor.toggle_grid()
-            elif key == ord('r'):
-                sensor.toggle_rgb()
-            elif key == ord('d'):
-                thinker.toggle_diagnostics()
-            elif key == ord('m'):
-                thinker.toggle_map()
-            elif key == ord('s'):
-                thinker.save_discovered_tiles()
-            elif key == ord('z'):
-                thinker.reset_learning()
-            elif key == ord('f'):
+            elif key == KEY_F:
                 show_fps = not show_fps
                 print(f"\nFPS display {'ON' if show_fps else 'OFF'}")
-            elif key == ord('l'):
-                thinker.toggle_learning()
             
-            # Maintain consistent timing
-            elapsed = time.time() - frame_start
-            remaining_time = config.main_loop_delay - elapsed
-            if remaining_time > 0:
-                time.sleep(remaining_time)
-
             # Display FPS if enabled
             if show_fps:
-                actual_frame_time = time.time() - frame_start
-                current_fps = 1.0 / actual_frame_time
-                fps_text = f"FPS: {current_fps:.1f} (Target: {config.loops_per_second})"
-                print(f"\r{fps_text}", end="", flush=True)
+                now = time.monotonic()
+                current_fps = 1.0 / max(now - frame_start, 1e-6)
+                fps_ema = current_fps if fps_ema == 0.0 else 0.9*fps_ema + 0.1*current_fps
+                if now - last_fps_print >= fps_print_interval:
+                    fps_text = f"FPS: {fps_ema:.1f} (Target: {config.loops_per_second})"
+                    print(f"\r{fps_text}", end="", flush=True)
+                    last_fps_print = now
             
     except KeyboardInterrupt:
         print("\nReceived interrupt signal")
@@ -144,6 +230,11 @@ def main():
         print(f"Error: {e}")
     finally:
         # Cleanup
+        stop_capture.set()
+        if capture_thread is not None:
+            capture_thread.join(timeout=1.0)
+        if thinker is not None:
+            thinker.close()
         cv2.destroyAllWindows()
         if emulator is not None:
             emulator.terminate()
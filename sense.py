@@ -4,24 +4,114 @@ import numpy as np
 import subprocess
 import time
 from pathlib import Path
-import pyautogui
-import json
+from mss import mss
+import re
+
+try:
+    from Xlib import X, display as xdisplay  # Installed with pynput on X11
+except ImportError:
+    xdisplay = None
+
+WINDOW_TITLE = 'Mesen - Dragon Warrior'
+
+# Fields of `xdotool getwindowgeometry` output, e.g. "Position: 10,20 (screen: 0)" / "Geometry: 256x240"
+WINDOW_POSITION_RE = re.compile(r'Position:\s*(-?\d+)[,+](-?\d+)')
+WINDOW_SIZE_RE = re.compile(r'Geometry:\s*(\d+)x(\d+)')
 
 class DragonWarriorSensor:
-    def __init__(self, grid_visible=True, rgb_display=False):
+    _geometry_cache = {}  # {window title: capture region}, shared by every sensor
+
+    def __init__(self, grid_visible=True, rgb_display=False, area_sample=False):
         self.rgb_window = None  # Renamed from diagnostic_window
         self.grid_visible = grid_visible
         self.rgb_display = rgb_display
+        # Average whole tiles with cv2.resize instead of one sampled line.
+        # Off by default: the learned type mappings are keyed on the line samples.
+        self.area_sample = area_sample
         self.window_geometry = self._get_window_geometry()
+        self.geometry_retry_interval = 1.0  # Seconds between lookups while captures fail
+        self._last_geometry_refresh = 0.0
         
         # Grid configuration
         self.GRID_SIZE = 15
         self.TILE_SIZE = 16
+        self._overlay_shape = None  # Frame shape the cached grid overlay was drawn for
+        self._sct = None  # Created by the first capture, on the thread that captures
+        
+        # Rendered RGB values cells, one per distinct colour ({packed_rgb: row})
+        self._rgb_tiles = np.zeros((256, 80, 80, 3), dtype=np.uint8)
+        self._rgb_tile_index = {}
+        self.rgb_interval = 0.1  # Rebuild the RGB values window at most 10 times a second
+        self._last_rgb_draw = 0.0
 
     def _get_window_geometry(self):
+        """Get window geometry, reusing an earlier sensor's lookup when there is one"""
+        geometry = self._geometry_cache.get(WINDOW_TITLE)
+        if geometry is None:
+            geometry = self._query_window_geometry()
+            if geometry is not None:
+                self._geometry_cache[WINDOW_TITLE] = geometry
+        return dict(geometry) if geometry is not None else None
+
+    def refresh_geometry(self):
+        """Re-locate the emulator window (e.g. after it moved), in-process when Xlib is available"""
+        geometry = self._xlib_window_geometry() if xdisplay is not None else None
+        if geometry is None:
+            geometry = self._query_window_geometry()
+        if geometry is not None:
+            self._geometry_cache[WINDOW_TITLE] = geometry
+            self.window_geometry = dict(geometry)
+        return self.window_geometry
+
+    def _capture_region(self, x, y, width, height):
+        """Turn the emulator window position into the 240x240 game capture region"""
+        return {
+            "left": x + 6,
+            "top": y - 40,
+            "width": 240,
+            "height": 240
+        }
+
+    def _xlib_window_geometry(self):
+        """Find the emulator window by walking the X window tree, without spawning xdotool"""
+        try:
+            disp = xdisplay.Display()
+        except Exception as e:
+            print(f"X display error: {e}")
+            return None
+        
+        try:
+            root = disp.screen().root
+            net_wm_name = disp.intern_atom('_NET_WM_NAME')
+            stack = [root]
+            while stack:
+                win = stack.pop()
+                try:
+                    prop = win.get_full_property(net_wm_name, X.AnyPropertyType)
+                    name = prop.value if prop else win.get_wm_name()
+                    if isinstance(name, bytes):
+                        name = name.decode('utf-8', 'replace')
+                    if name and WINDOW_TITLE in name:
+                        # Same position xdotool getwindowgeometry reports: parent-relative
+                        # for top-level windows, else the origin translated to the root
+                        geom = win.get_geometry()
+                        if win.query_tree().parent == root:
+                            x, y = geom.x, geom.y
+                        else:
+                            pos = root.translate_coords(win, 0, 0)
+                            x, y = pos.x, pos.y
+                        return self._capture_region(x, y, geom.width, geom.height)
+                    stack.extend(reversed(win.query_tree().children))
+                except Exception:
+                    continue  # Window went away mid-walk
+        finally:
+            disp.close()
+        return None
+
+    def _query_window_geometry(self):
         """Get window geometry using xdotool with automatic retries"""
         result = subprocess.run(
-            ['xdotool', 'search', '--name', 'Mesen - Dragon Warrior'],
+            ['xdotool', 'search', '--name', WINDOW_TITLE],
             capture_output=True, text=True, timeout=2
         )
         window_ids = result.stdout.strip().split('\n')
@@ -37,127 +127,199 @@ class DragonWarriorSensor:
                 )
                 geometry = result.stdout
                 
-                lines = [line.strip() for line in geometry.split('\n') if line.strip()]
-                if len(lines) < 3:
+                pos_match = WINDOW_POSITION_RE.search(geometry)
+                size_match = WINDOW_SIZE_RE.search(geometry)
+                if not pos_match or not size_match:
                     continue
-                    
-                pos_line = lines[1]
-                if '(' in pos_line:
-                    pos_part = pos_line.split('(')[0].split(':')[1].strip()
-                    x, y = map(int, pos_part.split(','))
-                else:
-                    pos_part = pos_line.split(':')[1].replace(',', '').strip()
-                    x, y = map(int, pos_part.split('+'))
-                
-                size_part = lines[2].split(':')[1].strip()
-                width, height = map(int, size_part.split('x'))
+                x, y = map(int, pos_match.groups())
+                width, height = map(int, size_match.groups())
                 
-                print(f"Window geometry: x={x}, y={y}, width={width}, height={height}")
-                return {
-                    "left": x + 6,
-                    "top": y - 40,
-                    "width": 240,
-                    "height": 240
-                }
+                return self._capture_region(x, y, width, height)
                 
             except (IndexError, ValueError) as e:
                 continue
 
-    def _create_rgb_window(self, rgb_grid):
-        """Create window showing RGB values for each tile"""
-        scale_factor = 8
+    def _create_rgb_window(self, rgb_grid, out=None):
+        """Create window showing RGB values for each tile (drawn into out if given)"""
         h, w = rgb_grid.shape[0], rgb_grid.shape[1]
-        rgb_img = np.zeros((h*scale_factor*10, w*scale_factor*10, 3), dtype=np.uint8)
+        cell = self._rgb_tiles.shape[1]
+        shape = (h*cell, w*cell, 3)
+        if out is not None and out.shape == shape:
+            rgb_img = out
+        else:
+            rgb_img = np.empty(shape, dtype=np.uint8)
         
-        for y in range(h):
-            for x in range(w):
-                r, g, b = rgb_grid[y, x]
-                px = x * scale_factor * 10 + 5
-                py = y * scale_factor * 10 + 5
-                
-                # Draw colored rectangle (BGR order for OpenCV)
-                cv2.rectangle(rgb_img, 
-                            (px, py), 
-                            (px + scale_factor*9, py + scale_factor*9),
-                            (int(b), int(g), int(r)), -1)
-                
-                # Show RGB values
-                cv2.putText(rgb_img, f"R:{r:03}",
-                          (px, py + scale_factor*2),
-                          cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255,255,255), 1)
-                cv2.putText(rgb_img, f"G:{g:03}",
-                          (px, py + scale_factor*5),
-                          cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255,255,255), 1)
-                cv2.putText(rgb_img, f"B:{b:03}",
-                          (px, py + scale_factor*8),
-                          cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255,255,255), 1)
+        # Only a handful of distinct colours are on screen, so render each one's cell
+        # once and reuse it until the cache fills up
+        packed = ((rgb_grid[..., 0].astype(np.uint32) << 16) |
+                  (rgb_grid[..., 1].astype(np.uint32) << 8) | rgb_grid[..., 2])
+        keys, inverse = np.unique(packed, return_inverse=True)
+        if len(self._rgb_tile_index) + len(keys) > len(self._rgb_tiles):
+            self._rgb_tile_index.clear()
+        rows = np.empty(len(keys), dtype=np.intp)
+        for i, key in enumerate(keys.tolist()):
+            row = self._rgb_tile_index.get(key)
+            if row is None:
+                row = len(self._rgb_tile_index)
+                self._render_rgb_tile(self._rgb_tiles[row], key)
+                self._rgb_tile_index[key] = row
+            rows[i] = row
         
+        # Lay the cells out as a (h*cell, w*cell) image in one gather
+        tiles = self._rgb_tiles[rows[inverse.reshape(h, w)]]
+        rgb_img.reshape(h, cell, w, cell, 3)[...] = tiles.transpose(0, 2, 1, 3, 4)
         return rgb_img
+
+    def _render_rgb_tile(self, tile, packed):
+        """Draw one RGB values cell (swatch and labels) for a packed colour into tile"""
+        scale_factor = 8
+        r, g, b = (packed >> 16) & 0xFF, (packed >> 8) & 0xFF, packed & 0xFF
+        px = py = 5
+        tile.fill(0)
+        
+        # Colored swatch (BGR order for OpenCV); a plain slice fill covers the same
+        # pixels as the filled cv2.rectangle, whose corners are inclusive
+        swatch = scale_factor*9 + 1
+        tile[py:py + swatch, px:px + swatch] = (b, g, r)
+        
+        # Show RGB values
+        cv2.putText(tile, f"R:{r:03}",
+                  (px, py + scale_factor*2),
+                  cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255,255,255), 1)
+        cv2.putText(tile, f"G:{g:03}",
+                  (px, py + scale_factor*5),
+                  cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255,255,255), 1)
+        cv2.putText(tile, f"B:{b:03}",
+                  (px, py + scale_factor*8),
+                  cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255,255,255), 1)
     
-    def capture_frame(self, debug=False):
-        """Capture and process game frame using PyAutoGUI"""
+    def capture_frame(self, debug=False, grid_out=None, frame_out=None, rgb_img_out=None):
+        """Capture and process game frame using MSS, filling the *_out buffers when given
+        Returns (frame, rgb_grid, rgb_img): frame is BGR for OpenCV display, rgb_grid stays RGB,
+        rgb_img is the RGB values image when enabled. Returned arrays alias the buffers passed in"""
         try:
-            # Capture screen region with PyAutoGUI
-            screenshot = pyautogui.screenshot(
-                region=(
-                    self.window_geometry["left"],
-                    self.window_geometry["top"],
-                    self.window_geometry["width"],
-                    self.window_geometry["height"]
-                )
-            )
+            # MSS handles are per-thread, so open it where capture actually runs
+            if self._sct is None:
+                self._sct = mss()
+            
+            # Capture screen region with MSS (window_geometry is already an MSS monitor dict)
+            shot = self._sct.grab(self.window_geometry)
             
-            # Convert to numpy array and then to RGB format
-            frame_rgb = np.array(screenshot)
+            # View MSS's BGRA buffer without copying, then drop alpha into the BGR OpenCV displays
+            frame_bgra = np.frombuffer(shot.raw, dtype=np.uint8).reshape(shot.height, shot.width, 4)
+            if frame_out is not None and frame_out.shape == (shot.height, shot.width, 3):
+                frame_bgr = cv2.cvtColor(frame_bgra, cv2.COLOR_BGRA2BGR, dst=frame_out)
+            else:
+                frame_bgr = cv2.cvtColor(frame_bgra, cv2.COLOR_BGRA2BGR)
 
             if debug:
                 debug_file = Path("debug_capture.png")
-                cv2.imwrite(str(debug_file), frame_rgb)
+                cv2.imwrite(str(debug_file), frame_bgr)
 
             if self.grid_visible:
-                frame, rgb_grid = self._process_frame(frame_rgb)
-                if self.rgb_display:
-                    rgb_img = self._create_rgb_window(rgb_grid)
-                    if self.rgb_window is None:
-                        self.rgb_window = "Tile RGB Values"
-                        cv2.namedWindow(self.rgb_window, cv2.WINDOW_NORMAL)
-                        cv2.resizeWindow(self.rgb_window, 650, 700)
-                        cv2.moveWindow(self.rgb_window, 0, 350)  # This line moves the window
-                    cv2.imshow(self.rgb_window, rgb_img)
+                frame, rgb_grid = self._process_frame(frame_bgr, grid_out)
+                rgb_img = None
+                now = time.monotonic()
+                if self.rgb_display and now - self._last_rgb_draw >= self.rgb_interval:
+                    rgb_img = self._create_rgb_window(rgb_grid, rgb_img_out)
+                    self._last_rgb_draw = now
                 
-                return frame, rgb_grid, None
+                return frame, rgb_grid, rgb_img
             else:
                 # When grid is disabled, return the frame with None for rgb_grid
-                return frame_rgb, None, None
+                return frame_bgr, None, None
                 
         except Exception as e:
             print(f"Capture error: {e}")
+            # The emulator window may have moved or only just appeared, so look it
+            # up again (at most once per geometry_retry_interval)
+            now = time.monotonic()
+            if now - self._last_geometry_refresh >= self.geometry_retry_interval:
+                self._last_geometry_refresh = now
+                try:
+                    self.refresh_geometry()
+                except Exception as e:
+                    print(f"Window lookup error: {e}")
             blank = np.zeros((256, 256, 3), dtype=np.uint8)
             return blank, None, None
 
-    def _process_frame(self, frame):
-        """Process frame with grid analysis"""
+    def new_capture_buffers(self):
+        """Allocate a [frame, rgb_grid, rgb_img] buffer set for capture_frame to fill
+        rgb_img starts as None and is kept once capture_frame first allocates it; frame is
+        None while the window geometry is unknown (capture_frame then returns blank frames)"""
+        frame = None
+        if self.window_geometry is not None:
+            frame = np.empty((self.window_geometry["height"], self.window_geometry["width"], 3), dtype=np.uint8)
+        rgb_grid = np.empty((self.GRID_SIZE, self.GRID_SIZE, 3), dtype=np.uint8)
+        return [frame, rgb_grid, None]
+
+    def _process_frame(self, frame, rgb_grid=None):
+        """Process BGR frame with grid analysis, sampling tile colours into an RGB grid"""
         h, w = frame.shape[:2]
         cell_size = h // self.GRID_SIZE
-        rgb_grid = np.zeros((self.GRID_SIZE, self.GRID_SIZE, 3), dtype=np.uint8)
+        if rgb_grid is None:
+            rgb_grid = np.zeros((self.GRID_SIZE, self.GRID_SIZE, 3), dtype=np.uint8)
+        
+        span = self.GRID_SIZE * cell_size
+        if self.area_sample:
+            # Mean of every pixel in each tile, in one OpenCV call
+            avg_bgr = cv2.resize(frame[:span, :span], (self.GRID_SIZE, self.GRID_SIZE),
+                                 interpolation=cv2.INTER_AREA)
+            rgb_grid[...] = avg_bgr[..., ::-1]
+        else:
+            # Sample every tile at once: the line 12 down from the top of each tile,
+            # skipping the first 4 pixels and averaging the next 9
+            rows = frame[12:span:cell_size, :span]
+            segments = rows.reshape(self.GRID_SIZE, self.GRID_SIZE, cell_size, 3)[:, :, 4:13]
+            # Integer sum and floor division match mean().astype(uint8) without float temporaries
+            sums = segments.sum(axis=2, dtype=np.uint16)
+            np.floor_divide(sums[..., ::-1], segments.shape[2], out=rgb_grid, casting='unsafe')
+        
+        # The overlay never moves, so it is drawn once and copied on with its mask
+        overlay, mask = self._grid_overlay(frame.shape, cell_size)
+        np.copyto(frame, overlay, where=mask)
         
+        return frame, rgb_grid
+
+    def _grid_overlay(self, shape, cell_size):
+        """Return the (overlay, mask) of cell and sampling boundaries for a frame shape"""
+        if self._overlay_shape == shape:
+            return self._overlay, self._overlay_mask
+
+        overlay = np.zeros(shape, dtype=np.uint8)
         for grid_y in range(self.GRID_SIZE):
             for grid_x in range(self.GRID_SIZE):
-                x_start = grid_x * cell_size + 4    # Ignore the 3 pixels at the beginning of the tile
-                x_end = x_start + 9                # Sample 10 pixels wide
-                y_pos = grid_y * cell_size + 12     # read the line 12 down from the top of the tile
-                
-                row_segment = frame[y_pos, x_start:x_end]
-                avg_rgb = np.mean(row_segment, axis=0).astype(np.uint8)
-                rgb_grid[grid_y, grid_x] = [avg_rgb[0], avg_rgb[1], avg_rgb[2]]
+                x_start = grid_x * cell_size + 4
+                x_end = x_start + 9
+                y_pos = grid_y * cell_size + 12
                 
                 # Draw cell boundaries (green)
-                cv2.rectangle(frame, (grid_x * cell_size, grid_y * cell_size), ((grid_x + 1) * cell_size, (grid_y + 1) * cell_size), (0, 255, 0), 1)
+                cv2.rectangle(overlay, (grid_x * cell_size, grid_y * cell_size), ((grid_x + 1) * cell_size, (grid_y + 1) * cell_size), (0, 255, 0), 1)
 
                 # Draw sampling boundaries (red)
-                cv2.rectangle(frame, (x_start-1, y_pos-1), (x_end, y_pos+1), (255, 0, 0), 1)
-        
-        return frame, rgb_grid
+                cv2.rectangle(overlay, (x_start-1, y_pos-1), (x_end, y_pos+1), (0, 0, 255), 1)
+
+        self._overlay = overlay
+        self._overlay_mask = overlay.any(axis=2, keepdims=True)
+        self._overlay_shape = shape
+        return self._overlay, self._overlay_mask
+
+    def show_rgb_window(self, rgb_img):
+        """Display the RGB values image (call from the GUI thread)"""
+        if not self.rgb_display or rgb_img is None:
+            return
+        if self.rgb_window is not None and cv2.getWindowProperty(self.rgb_window, cv2.WND_PROP_VISIBLE) < 1:
+            # Closed by the user, so stop building it until toggled back on
+            self.rgb_display = False
+            self.rgb_window = None
+            print("RGB display OFF")
+            return
+        if self.rgb_window is None:
+            self.rgb_window = "Tile RGB Values"
+            cv2.namedWindow(self.rgb_window, cv2.WINDOW_NORMAL)
+            cv2.resizeWindow(self.rgb_window, 650, 700)
+            cv2.moveWindow(self.rgb_window, 0, 350)  # This line moves the window
+        cv2.imshow(self.rgb_window, rgb_img)
 
     def toggle_grid(self): 
         self.grid_visible = not self.grid_visible
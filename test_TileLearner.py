@@ -0,0 +1,89 @@
+#!/venv/bin/python3
+"""
+TileLearner belief tracking tests
+"""
+
+import contextlib
+import io
+import numpy as np
+from TileAnalyzer import TileAnalyzer
+from TileLearner import TileLearner
+
+class PackOnlyAnalyzer:
+    """Just enough analyzer for the learner's RGB packing"""
+    _pack = staticmethod(TileAnalyzer._pack)
+
+def make_analyzer(color_to_type, type_aliases, tile_properties=None):
+    """Analyzer with in-memory mappings (no mappings file or screen access)"""
+    analyzer = object.__new__(TileAnalyzer)
+    analyzer.color_to_type = color_to_type
+    analyzer.type_aliases = type_aliases
+    analyzer.tile_properties = tile_properties or {}
+    analyzer._mappings_version = 0
+    analyzer._grid_shape = None
+    analyzer._rebuild_lookup()
+    return analyzer
+
+def observe(learner, position, colors):
+    """Feed a sequence of RGB observations for one position, discarding suggestion output"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        for rgb in colors:
+            learner._update_rgb_beliefs(position, rgb)
+
+def test_counts_sum_to_window_length():
+    rng = np.random.default_rng(0)
+    palette = [tuple(int(v) for v in rng.integers(0, 256, 3)) for _ in range(5)]
+    learner = TileLearner(PackOnlyAnalyzer())
+    row = learner._row_for((0, 0))
+    for i in range(200):
+        observe(learner, (0, 0), [palette[rng.integers(len(palette))]])
+        counts = learner._count_table[row]
+        assert int(counts.sum()) == min(i + 1, learner.observation_window_size)
+        rgbs = learner._rgb_table[row][counts > 0].tolist()
+        assert len(set(rgbs)) == len(rgbs)
+
+def test_evicted_colors_leave_exact_counts():
+    a, b, c, d = (1, 1, 1), (2, 2, 2), (3, 3, 3), (4, 4, 4)
+    learner = TileLearner(PackOnlyAnalyzer())
+    observe(learner, (0, 0), [a, b, c, d, a] + [a] * 40)
+    assert learner._get_top_rgb_values((0, 0)) == [(a, 30, 1.0)]
+
+def test_least_observed_color_is_pruned():
+    a, b, c, d = (1, 1, 1), (2, 2, 2), (3, 3, 3), (4, 4, 4)
+    learner = TileLearner(PackOnlyAnalyzer())
+    observe(learner, (0, 0), [a] * 10 + [b] * 5 + [c] * 3 + [d])
+    top = learner._get_top_rgb_values((0, 0))
+    assert [(rgb, count) for rgb, count, _ in top] == [(a, 10), (b, 5), (c, 3)]
+    assert abs(sum(prob for _, _, prob in top) - 1.0) < 1e-9
+
+def test_colors_without_a_real_alias_are_learned():
+    # 1 has no alias, 3 is aliased "unknown"; both count as unknown tiles
+    analyzer = make_analyzer({"9,9,9": 0, "1,1,1": 1, "2,2,2": 2, "3,3,3": 3},
+                             {"0": "player", "2": "block", "3": "unknown"})
+    learner = TileLearner(analyzer)
+    grid = np.zeros((15, 15, 3), dtype=np.uint8)
+    grid[7, 7] = (9, 9, 9)
+    grid[7, 6], grid[7, 8], grid[6, 7] = (1, 1, 1), (3, 3, 3), (2, 2, 2)
+    with contextlib.redirect_stdout(io.StringIO()):
+        learner.process_grid(grid, analyzer.analyze_grid(grid))
+    assert set(learner._pos_index) == {(6, 7), (8, 7), (7, 8)}
+
+def test_every_player_type_id_passes_player_check():
+    # One player type_id per facing direction
+    analyzer = make_analyzer({"9,9,9": 0, "8,8,8": 1, "7,7,7": 2},
+                             {"0": "player", "1": "player", "2": "block"})
+    learner = TileLearner(analyzer)
+    grid = np.zeros((15, 15, 3), dtype=np.uint8)
+    for player_rgb in ((9, 9, 9), (8, 8, 8)):
+        grid[7, 7] = player_rgb
+        with contextlib.redirect_stdout(io.StringIO()):
+            learner.process_grid(grid, analyzer.analyze_grid(grid))
+    assert learner.get_observation_stats()['total_observations'] == 8
+
+def test_next_alias_follows_the_highest_learned_alias():
+    # Hand-named "WATER" is all capitals too, but only learned tiles take generated aliases
+    learned = {'learned': True}
+    analyzer = make_analyzer({}, {"0": "player", "1": "A", "2": "WATER", "3": "Z"},
+                             {"A": learned, "WATER": {'walkable': False}, "Z": learned})
+    analyzer._learned_alias_count = analyzer._next_learned_alias_index()
+    assert TileLearner(analyzer)._generate_alias() == "AA"
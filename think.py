@@ -4,6 +4,8 @@ Main Thinking Controller with POMDP learning and World Mapping
 Coordinates tile analysis, probabilistic learning, and world mapping
 """
 
+import queue
+import threading
 from TileAnalyzer import TileAnalyzer
 from TileLearner import TileLearner
 from mapping import WorldMapper
@@ -17,21 +19,78 @@ class Think:
         self.show_diag = False
         self.show_map = False
         self.player_global_pos = (128, 128)  # Starting in middle of 256x256 map
+        
+        # Analysis and learning run on a worker fed the newest grid only. The lock
+        # guards the learner and the mappings against the main thread's save/reset/
+        # stats calls; the per-frame path never takes it
+        self._lock = threading.Lock()
+        self._grids = queue.Queue(maxsize=1)
+        self._latest_type_ids = None  # Replaced whole by the worker, never mutated
+        self._last_grid_key = None  # (mappings version, grid bytes) behind _latest_type_ids
+        self._stop = threading.Event()
+        self._worker_thread = threading.Thread(target=self._worker, daemon=True)
+        self._worker_thread.start()
 
     def process_frame(self, rgb_grid):
-        """Process a frame through analysis, learning, and mapping"""
-        alias_grid = self.analyzer.analyze_grid(rgb_grid)
+        """Queue a frame for analysis and learning, and show the latest results
+        Returns the type_ids of the most recently analyzed frame, which lags the
+        frame just queued by at least one call (None until the first)"""
+        if rgb_grid is not None:
+            grid = rgb_grid.copy()  # The caller recycles its capture buffer
+            try:
+                self._grids.put_nowait(grid)
+            except queue.Full:
+                # Replace the frame the worker has not picked up yet
+                try:
+                    self._grids.get_nowait()
+                except queue.Empty:
+                    pass
+                self._grids.put_nowait(grid)
         
-        if alias_grid is not None:
-            # Process learning (automatically checks player position)
-            self.learner.process_grid(rgb_grid, alias_grid)
-            
+        # HighGUI calls stay on the caller's thread. Diagnostics only read the
+        # published type_ids and lookup arrays that change on this thread alone
+        type_ids = self._latest_type_ids
+        if type_ids is not None:
             if self.show_diag:
-                self.analyzer.show_diagnostics(alias_grid)
+                if not self.analyzer.show_diagnostics(type_ids):
+                    self.show_diag = False
+                    print("Diagnostics display OFF")
             else:
                 self.analyzer.close_diagnostics()
+
+        # Persist learned mappings at most every few seconds (they are only
+        # changed on this thread, by save_discovered_tiles)
+        self.analyzer._flush_if_due()
         
-        return alias_grid
+        return type_ids
+
+    def _worker(self):
+        """Analyze and learn from queued grids until close() is called"""
+        type_ids = None
+        while not self._stop.is_set():
+            try:
+                rgb_grid = self._grids.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            with self._lock:
+                # Emulator polls often repeat the same screen: only re-classify when the
+                # grid or the mappings changed, but keep counting observations either way
+                grid_key = (self.analyzer._mappings_version, rgb_grid.tobytes())
+                if grid_key != self._last_grid_key:
+                    analyzed = self.analyzer.analyze_grid(rgb_grid)
+                    if analyzed is not None:
+                        # analyze_grid reuses its output array, so publish a copy
+                        type_ids = analyzed.copy()
+                        self._latest_type_ids = type_ids
+                    self._last_grid_key = grid_key
+                if type_ids is not None:
+                    # Process learning (automatically checks player position)
+                    self.learner.process_grid(rgb_grid, type_ids)
+
+    def close(self):
+        """Stop the analysis worker"""
+        self._stop.set()
+        self._worker_thread.join(timeout=1.0)
     
     def update_player_position(self, dx, dy):
         """Update player's global position based on movement"""
@@ -42,7 +101,8 @@ class Think:
     
     def reset_learning(self):
         """Reset the learning process"""
-        self.learner.reset_learning()
+        with self._lock:
+            self.learner.reset_learning()
 
     def toggle_map(self):
         """Toggle diagnostics window"""
@@ -51,14 +111,15 @@ class Think:
 
     def save_discovered_tiles(self):
         """Save candidate tiles with confirmation"""
-        stats = self.learner.get_observation_stats()
-        if stats['candidates_ready'] == 0:
-            print("No tiles meet confidence thresholds yet")
-            return False
-            
-        print(f"\nAbout to save {stats['candidates_ready']} tiles:")
-        print(f"Average confidence: {stats['average_confidence']:.1%}")
-        return self.learner.save_new_tiles()
+        with self._lock:
+            stats = self.learner.get_observation_stats()
+            if stats['candidates_ready'] == 0:
+                print("No tiles meet confidence thresholds yet")
+                return False
+                
+            print(f"\nAbout to save {stats['candidates_ready']} tiles:")
+            print(f"Average confidence: {stats['average_confidence']:.1%}")
+            return self.learner.save_new_tiles()
 
     def toggle_diagnostics(self):
         """Toggle diagnostics window"""
@@ -69,11 +130,13 @@ class Think:
 
     def toggle_learning(self):
         """Toggle the learning process on/off"""
-        self.learner.toggle_learning()
+        with self._lock:
+            self.learner.toggle_learning()
 
     def get_learning_stats(self):
         """Return current learning statistics"""
-        return self.learner.get_observation_stats()
+        with self._lock:
+            return self.learner.get_observation_stats()
 
 if __name__ == "__main__":
     print("Initializing Think controller with POMDP learning and world mapping...")